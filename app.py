@@ -1,11 +1,10 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from scipy import stats
 import base64
 import datetime
+import io
+import os
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -75,81 +74,270 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # --- 1. Data Loading Engine ---
+TRADES_CSV = 'historical_data.csv'
+SENTIMENT_CSV = 'fear_greed_index.csv'
+MERGED_PARQUET = 'merged.parquet'
+SENTIMENT_ORDER = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
+
+def parquet_is_fresh():
+    # Sidecar is only valid if newer than both CSVs and this script
+    try:
+        cached_mtime = os.stat(MERGED_PARQUET).st_mtime
+    except OSError:
+        return False
+    sources = (TRADES_CSV, SENTIMENT_CSV, __file__)
+    return all(cached_mtime > os.stat(src).st_mtime for src in sources)
+
 @st.cache_data
 def load_data():
     try:
-        # Load CSVs
-        trader_df = pd.read_csv('historical_data.csv')
-        sentiment_df = pd.read_csv('fear_greed_index.csv')
+        # Fast path: reuse the already-parsed frame from a previous cold start
+        if parquet_is_fresh():
+            return pd.read_parquet(MERGED_PARQUET)
+        
+        # Load CSVs (multi-threaded Arrow parser, only the columns we use)
+        trader_df = pd.read_csv(
+            TRADES_CSV,
+            engine='pyarrow',
+            usecols=['Coin', 'Side', 'Size USD', 'Closed PnL', 'Timestamp IST']
+        )
+        sentiment_df = pd.read_csv(
+            SENTIMENT_CSV,
+            engine='pyarrow',
+            usecols=['date', 'value', 'classification']
+        )
         
         # Clean & Format Dates
         trader_df['Timestamp IST'] = pd.to_datetime(trader_df['Timestamp IST'], format='%d-%m-%Y %H:%M', dayfirst=True)
-        trader_df['Date'] = trader_df['Timestamp IST'].dt.date
-        trader_df['Date'] = pd.to_datetime(trader_df['Date'])
+        trader_df['Date'] = trader_df['Timestamp IST'].dt.normalize()
         
         sentiment_df['Date'] = pd.to_datetime(sentiment_df['date'])
         sentiment_df = sentiment_df.rename(columns={'value': 'Sentiment_Score', 'classification': 'Sentiment_Class'})
+        sentiment_df = sentiment_df.sort_values('Date')
+        
+        # Merge: one reading per day, so broadcast it onto trades by binary search
+        sent_days = sentiment_df['Date'].values.astype('datetime64[ns]', copy=False)
+        trade_days = trader_df['Date'].values.astype('datetime64[ns]', copy=False)
+        idx = np.searchsorted(sent_days, trade_days).clip(max=len(sent_days) - 1)
+        matched = sent_days[idx] == trade_days # Inner join: drop days without a reading
+        idx = idx[matched]
+        merged_df = trader_df[matched].reset_index(drop=True).assign(
+            Sentiment_Score=sentiment_df['Sentiment_Score'].values[idx],
+            Sentiment_Class=sentiment_df['Sentiment_Class'].values[idx]
+        )
+        
+        # Ordered sentiment: codes 0..4 follow SENTIMENT_ORDER (unknown labels are dropped)
+        merged_df['Sentiment_Class'] = pd.Categorical(merged_df['Sentiment_Class'], categories=SENTIMENT_ORDER, ordered=True)
+        merged_df = merged_df[merged_df['Sentiment_Class'].notna()].reset_index(drop=True)
+        
+        # Categorical filter columns: membership tests become integer code lookups
+        # (built after the drop so the sidebar only offers coins/sides that still have rows)
+        merged_df['Coin'] = merged_df['Coin'].astype('category')
+        merged_df['Side'] = merged_df['Side'].astype('category')
+        
+        # Narrow numeric storage; aggregation accumulates in float64
+        for col in ['Closed PnL', 'Size USD', 'Sentiment_Score']:
+            merged_df[col] = merged_df[col].astype('float32')
         
-        # Merge
-        merged_df = pd.merge(trader_df, sentiment_df, on='Date', how='inner')
+        # Persist parsed dtypes for the next cold start (best effort, e.g. read-only deploys)
+        try:
+            merged_df.to_parquet(MERGED_PARQUET, index=False)
+        except OSError:
+            pass
         return merged_df
     except Exception as e:
         st.error(f"Data Loading Error: {e}")
         return None
 
+@st.cache_data(show_spinner=False)
+def date_bounds():
+    # Dataset date range, scanned once instead of on every rerun
+    dates = load_data()['Date']
+    return dates.min().date(), dates.max().date()
+
 # --- 2. Analytical Engine ---
-def calculate_metrics(df):
-    # Core Logic
-    df['Is_Win'] = df['Closed PnL'] > 0
-    df['Win_Amt'] = df.loc[df['Is_Win'], 'Closed PnL']
-    df['Loss_Amt'] = df.loc[~df['Is_Win'], 'Closed PnL']
-    
-    # Grouping
-    sentiment_order = ['Extreme Fear', 'Fear', 'Neutral', 'Greed', 'Extreme Greed']
-    stats_df = df.groupby('Sentiment_Class').agg({
-        'Closed PnL': ['mean', 'sum', 'std'],
-        'Win_Amt': 'mean',
-        'Loss_Amt': 'mean',
-        'Size USD': 'mean',
-        'Is_Win': 'mean',
-        'Account': 'count',
-        'Sentiment_Score': 'mean'
-    }).reset_index()
-    
-    stats_df.columns = ['Sentiment', 'Avg_PnL', 'Total_PnL', 'PnL_Std', 'Avg_Win_Size', 'Avg_Loss_Size', 'Avg_Position_Size', 'Win_Rate', 'Trade_Count', 'Avg_Sentiment']
-    
-    # --- Advanced Math & Quant Metrics ---
-    stats_df['Avg_Loss_Size'] = stats_df['Avg_Loss_Size'].abs()
-    stats_df['Risk_Reward_Ratio'] = stats_df['Avg_Win_Size'] / stats_df['Avg_Loss_Size']
+def category_mask(col, selected):
+    # Compare integer category codes rather than hashing every string
+    sel_codes = col.cat.categories.get_indexer(selected)
+    return np.isin(col.cat.codes.values, sel_codes[sel_codes >= 0])
+
+def calculate_metrics(codes, pnl, size, score):
+    # Core Logic: per-sentiment sums as weighted bincounts over the 0..4 codes
+    k = len(SENTIMENT_ORDER)
+    pnl = pnl.astype(np.float64)
+    is_win = pnl > 0
+    sums = (
+        np.bincount(codes, minlength=k),
+        np.bincount(codes, pnl, minlength=k),
+        np.bincount(codes, pnl * pnl, minlength=k),
+        np.bincount(codes, np.where(is_win, pnl, 0.0), minlength=k),
+        np.bincount(codes, is_win, minlength=k),
+        np.bincount(codes, size, minlength=k),
+        np.bincount(codes, score, minlength=k)
+    )
     
-    # Sharpe Ratio (Simplified: Return / Volatility)
-    # Avoid division by zero
-    stats_df['Sharpe_Ratio'] = np.where(stats_df['PnL_Std'] > 0, stats_df['Avg_PnL'] / stats_df['PnL_Std'], 0)
+    # Keep only the sentiments present in the selection
+    present = sums[0] > 0
+    n, pnl_sum, pnl_sq, win_sum, wins, size_sum, score_sum = (a[present] for a in sums)
     
-    # Kelly Criterion Calculation (Optimal Bet Size)
-    # K% = W - (1-W)/R
-    stats_df['Kelly_Criterion'] = (stats_df['Win_Rate'] - ((1 - stats_df['Win_Rate']) / stats_df['Risk_Reward_Ratio']))
-    stats_df['Kelly_Pct'] = stats_df['Kelly_Criterion'] * 100 # Convert to percentage
+    # Finalize on the small per-sentiment arrays; empty win/loss buckets and
+    # single-trade stds come out as NaN/inf, as they did with pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_pnl = pnl_sum / n
+        pnl_std = np.sqrt(np.clip((pnl_sq - pnl_sum ** 2 / n) / (n - 1), 0, None)) # Sample std (ddof=1)
+        avg_win = win_sum / wins
+        avg_loss = np.abs((pnl_sum - win_sum) / (n - wins))
+        win_rate = wins / n
+        
+        # --- Advanced Math & Quant Metrics ---
+        risk_reward = avg_win / avg_loss
+        
+        # Sharpe Ratio (Simplified: Return / Volatility)
+        # Avoid division by zero
+        sharpe = np.where(pnl_std > 0, avg_pnl / pnl_std, 0)
+        
+        # Kelly Criterion Calculation (Optimal Bet Size)
+        # K% = W - (1-W)/R
+        kelly = win_rate - (1 - win_rate) / risk_reward
     
-    # Sort
-    stats_df['Sentiment'] = pd.Categorical(stats_df['Sentiment'], categories=sentiment_order, ordered=True)
-    stats_df = stats_df.sort_values('Sentiment').set_index('Sentiment')
+    stats_df = pd.DataFrame({
+        'Avg_PnL': avg_pnl,
+        'Total_PnL': pnl_sum,
+        'PnL_Std': pnl_std,
+        'Avg_Win_Size': avg_win,
+        'Avg_Loss_Size': avg_loss,
+        'Avg_Position_Size': size_sum / n,
+        'Win_Rate': win_rate,
+        'Trade_Count': n,
+        'Avg_Sentiment': score_sum / n,
+        'Risk_Reward_Ratio': risk_reward,
+        'Sharpe_Ratio': sharpe,
+        'Kelly_Criterion': kelly,
+        'Kelly_Pct': kelly * 100 # Convert to percentage
+    }, index=pd.Index(np.array(SENTIMENT_ORDER)[present], name='Sentiment'))
     
     return stats_df
 
-def perform_hypothesis_test(df):
+def perform_hypothesis_test(stats_df):
+    from scipy import stats # Deferred: heavy import kept off the app boot path
+    
     # T-Test: Compare "Extreme Greed" PnL vs "Extreme Fear" PnL
-    group_greed = df[df['Sentiment_Class'] == 'Extreme Greed']['Closed PnL']
-    group_fear = df[df['Sentiment_Class'] == 'Extreme Fear']['Closed PnL']
+    # Welch's test only needs mean / std / n, already computed per sentiment
+    if 'Extreme Greed' not in stats_df.index or 'Extreme Fear' not in stats_df.index:
+        return None, None
+    m1, s1, n1 = stats_df.loc['Extreme Greed', ['Avg_PnL', 'PnL_Std', 'Trade_Count']]
+    m2, s2, n2 = stats_df.loc['Extreme Fear', ['Avg_PnL', 'PnL_Std', 'Trade_Count']]
     
     # Safety check for sample size
-    if len(group_greed) < 2 or len(group_fear) < 2:
+    if n1 < 2 or n2 < 2:
         return None, None
     
-    t_stat, p_val = stats.ttest_ind(group_greed, group_fear, equal_var=False)
+    t_stat, p_val = stats.ttest_ind_from_stats(m1, s1, n1, m2, s2, n2, equal_var=False)
     return t_stat, p_val
 
-# --- 3. Main Application ---
+@st.cache_data(show_spinner=False)
+def compute_all(start_date, end_date, selected_coins, selected_sides):
+    # Pure over the filter selections; pass tuples so the cache key hashes in O(k)
+    raw_df = load_data()
+    min_date, max_date = date_bounds()
+    
+    # Compare on the raw datetime64 buffer; end bound is exclusive next midnight
+    lo = np.datetime64(start_date)
+    hi = np.datetime64(end_date) + np.timedelta64(1, 'D')
+    dates = raw_df['Date'].values
+    full_selection = (
+        set(selected_coins) == set(raw_df['Coin'].cat.categories) and
+        set(selected_sides) == set(raw_df['Side'].cat.categories) and
+        start_date <= min_date and end_date >= max_date
+    )
+    if full_selection:
+        idx = slice(None) # Everything selected: read the columns in place, no mask or copy
+    else:
+        mask = (
+            (dates >= lo) & 
+            (dates < hi) &
+            category_mask(raw_df['Coin'], selected_coins) &
+            category_mask(raw_df['Side'], selected_sides)
+        )
+        idx = np.flatnonzero(mask)
+    
+    # Gather just the aggregated columns rather than copying whole rows
+    codes = raw_df['Sentiment_Class'].cat.codes.values[idx]
+    if len(codes) == 0:
+        return None, None, None, 0
+    stats_df = calculate_metrics(
+        codes,
+        raw_df['Closed PnL'].values[idx],
+        raw_df['Size USD'].values[idx],
+        raw_df['Sentiment_Score'].values[idx]
+    )
+    t_stat, p_val = perform_hypothesis_test(stats_df)
+    return stats_df, t_stat, p_val, len(codes)
+
+# --- 3. Chart Rendering ---
+SENTIMENT_COLORS = dict(zip(SENTIMENT_ORDER, ['#c0392b', '#e67e22', '#f1c40f', '#2ecc71', '#27ae60']))
+
+def figure_to_png(fig):
+    import matplotlib.pyplot as plt
+    
+    # Same settings st.pyplot uses, so the cached image looks identical
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=200)
+    plt.close(fig)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False)
+def render_pnl_chart(sentiments, avg_pnl):
+    import matplotlib.pyplot as plt # Deferred until a chart actually renders
+    
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.bar(range(len(sentiments)), avg_pnl, color=[SENTIMENT_COLORS[s] for s in sentiments])
+    ax.set_xticks(range(len(sentiments)))
+    ax.set_xticklabels(sentiments)
+    ax.axhline(0, color='black')
+    ax.set_ylabel("Avg PnL ($)")
+    return figure_to_png(fig)
+
+@st.cache_data(show_spinner=False)
+def render_kelly_chart(sentiments, kelly_pct):
+    import matplotlib.pyplot as plt # Deferred until a chart actually renders
+    
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.bar(range(len(sentiments)), kelly_pct, color=plt.cm.viridis(np.linspace(0, 1, len(sentiments))))
+    ax.set_xticks(range(len(sentiments)))
+    ax.set_xticklabels(sentiments)
+    ax.set_ylabel("Optimal Allocation (%)")
+    return figure_to_png(fig)
+
+# --- 4. Report Builder ---
+@st.cache_data(show_spinner=False)
+def build_report(report_date, start_date, end_date, n_coins, n_trades, eg_pnl, eg_sharpe, eg_kelly, ef_kelly):
+    # Keyed on the report inputs (date included so cached reports roll over daily)
+    report_html = f"""
+    <div class="report-container">
+        <h1 class="report-header">📊 Strategic Analysis Report</h1>
+        <p><strong>Date:</strong> {report_date}<br>
+        <strong>Filter Context:</strong> {start_date} to {end_date} | Coins: {n_coins} Selected</p>
+        
+        <h3>1. Executive Summary</h3>
+        <p>Analysis of the selected <strong>{n_trades:,} trades</strong> shows that the strategy generates an average PnL of 
+        <span class="highlight-green">${eg_pnl:.2f}</span> during Extreme Greed periods.</p>
+        
+        <h3>2. Risk Management (Kelly Criterion)</h3>
+        <ul>
+            <li><strong>Aggressive Zone (Greed):</strong> The math supports an allocation of <strong>{eg_kelly:.2f}%</strong>.</li>
+            <li><strong>Defensive Zone (Fear):</strong> Recommended allocation is <strong>{ef_kelly:.2f}%</strong>.</li>
+        </ul>
+        
+        <h3>3. Efficiency (Sharpe Ratio)</h3>
+        <p>The selected subset achieves a Max Sharpe Ratio of <strong>{eg_sharpe:.2f}</strong>, indicating robust risk-adjusted returns.</p>
+    </div>
+    """
+    b64 = base64.b64encode(report_html.encode()).decode()
+    href = f'<a href="data:text/html;base64,{b64}" download="Custom_Report.html">📥 Download HTML Report</a>'
+    return report_html, href
+
+# --- 5. Main Application ---
 def main():
     st.title("📈 Quant Intelligence Dashboard")
     st.markdown("### Statistical Validation & Risk Modeling")
@@ -162,8 +350,7 @@ def main():
         st.sidebar.header("🔍 Filter Analysis")
         
         # 1. Date Filter
-        min_date = raw_df['Date'].min().date()
-        max_date = raw_df['Date'].max().date()
+        min_date, max_date = date_bounds()
         
         st.sidebar.subheader("📅 Time Period")
         start_date = st.sidebar.date_input("Start Date", min_date, min_value=min_date, max_value=max_date)
@@ -171,7 +358,7 @@ def main():
         
         # 2. Coin Filter
         st.sidebar.subheader("🪙 Assets")
-        all_coins = sorted(raw_df['Coin'].unique().tolist())
+        all_coins = raw_df['Coin'].cat.categories.tolist()
         selected_coins = st.sidebar.multiselect("Select Coins", all_coins, default=all_coins[:5]) # Default to first 5 to avoid lag if many
         
         if not selected_coins:
@@ -180,25 +367,16 @@ def main():
 
         # 3. Side Filter (Buy/Sell)
         st.sidebar.subheader("⚖️ Trade Side")
-        all_sides = sorted(raw_df['Side'].unique().tolist())
+        all_sides = raw_df['Side'].cat.categories.tolist()
         selected_sides = st.sidebar.multiselect("Select Side", all_sides, default=all_sides)
         
-        # --- FILTERING LOGIC ---
-        mask = (
-            (raw_df['Date'].dt.date >= start_date) & 
-            (raw_df['Date'].dt.date <= end_date) &
-            (raw_df['Coin'].isin(selected_coins)) &
-            (raw_df['Side'].isin(selected_sides))
-        )
-        filtered_df = raw_df[mask]
+        # --- FILTERING & ANALYTICS (cached per selection) ---
+        stats_df, t_stat, p_val, n_trades = compute_all(start_date, end_date, tuple(selected_coins), tuple(selected_sides))
         
         # --- MAIN DASHBOARD ---
-        if filtered_df.empty:
+        if n_trades == 0:
             st.warning("⚠️ No trades found for the selected filters. Please adjust your selection.")
         else:
-            stats_df = calculate_metrics(filtered_df)
-            t_stat, p_val = perform_hypothesis_test(filtered_df)
-            
             # --- KPIs ---
             with st.container():
                 best_zone = stats_df['Avg_PnL'].idxmax()
@@ -215,27 +393,21 @@ def main():
                 kpi1.metric("Filtered PnL Edge", best_zone, f"${stats_df.loc[best_zone, 'Avg_PnL']:.2f}/trade")
                 kpi2.metric("Statistical Confidence", conf_val, sig_text)
                 kpi3.metric("Max Sharpe Ratio", f"{stats_df['Sharpe_Ratio'].max():.2f}", "Risk-Adjusted Return")
-                kpi4.metric("Trades Analyzed", f"{len(filtered_df):,}", f"{(len(filtered_df)/len(raw_df))*100:.0f}% of total")
+                kpi4.metric("Trades Analyzed", f"{n_trades:,}", f"{(n_trades/len(raw_df))*100:.0f}% of total")
 
                 st.markdown("---")
                 
                 # --- CHARTS ---
                 c1, c2 = st.columns(2)
+                sentiments = tuple(stats_df.index)
                 with c1:
                     st.subheader("💸 Profitability by Sentiment")
-                    fig1, ax1 = plt.subplots(figsize=(8, 4))
-                    sns.barplot(x=stats_df.index, y=stats_df['Avg_PnL'], palette='RdYlGn', ax=ax1)
-                    ax1.axhline(0, color='black')
-                    ax1.set_ylabel("Avg PnL ($)")
-                    st.pyplot(fig1)
+                    st.image(render_pnl_chart(sentiments, tuple(stats_df['Avg_PnL'])), width='stretch')
                     
                 with c2:
                     st.subheader("📊 Kelly Criterion (Bet Sizing)")
-                    fig2, ax2 = plt.subplots(figsize=(8, 4))
                     kelly_plot = stats_df['Kelly_Pct'].apply(lambda x: max(0, x))
-                    sns.barplot(x=stats_df.index, y=kelly_plot, palette='viridis', ax=ax2)
-                    ax2.set_ylabel("Optimal Allocation (%)")
-                    st.pyplot(fig2)
+                    st.image(render_kelly_chart(sentiments, tuple(kelly_plot)), width='stretch')
 
                 # --- STATS & REPORT ---
                 st.markdown("---")
@@ -272,29 +444,11 @@ def main():
                     eg_kelly = max(0, stats_df.loc['Extreme Greed', 'Kelly_Pct'])
                     ef_kelly = max(0, stats_df.loc['Extreme Fear', 'Kelly_Pct'])
                     
-                    report_html = f"""
-                    <div class="report-container">
-                        <h1 class="report-header">📊 Strategic Analysis Report</h1>
-                        <p><strong>Date:</strong> {pd.Timestamp.now().strftime('%Y-%m-%d')}<br>
-                        <strong>Filter Context:</strong> {start_date} to {end_date} | Coins: {len(selected_coins)} Selected</p>
-                        
-                        <h3>1. Executive Summary</h3>
-                        <p>Analysis of the selected <strong>{len(filtered_df):,} trades</strong> shows that the strategy generates an average PnL of 
-                        <span class="highlight-green">${eg_pnl:.2f}</span> during Extreme Greed periods.</p>
-                        
-                        <h3>2. Risk Management (Kelly Criterion)</h3>
-                        <ul>
-                            <li><strong>Aggressive Zone (Greed):</strong> The math supports an allocation of <strong>{eg_kelly:.2f}%</strong>.</li>
-                            <li><strong>Defensive Zone (Fear):</strong> Recommended allocation is <strong>{ef_kelly:.2f}%</strong>.</li>
-                        </ul>
-                        
-                        <h3>3. Efficiency (Sharpe Ratio)</h3>
-                        <p>The selected subset achieves a Max Sharpe Ratio of <strong>{eg_sharpe:.2f}</strong>, indicating robust risk-adjusted returns.</p>
-                    </div>
-                    """
+                    report_html, href = build_report(
+                        pd.Timestamp.now().strftime('%Y-%m-%d'), start_date, end_date, len(selected_coins),
+                        n_trades, eg_pnl, eg_sharpe, eg_kelly, ef_kelly
+                    )
                     st.markdown(report_html, unsafe_allow_html=True)
-                    b64 = base64.b64encode(report_html.encode()).decode()
-                    href = f'<a href="data:text/html;base64,{b64}" download="Custom_Report.html">📥 Download HTML Report</a>'
                     st.markdown(href, unsafe_allow_html=True)
                 except KeyError:
                     st.error("Not enough data segments (Greed/Fear) in the current filter to generate a full comparative report.")